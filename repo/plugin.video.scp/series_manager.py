@@ -8,12 +8,34 @@ import os
 import io
 import re
 import json
+import string
+import functools
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from itertools import repeat
+from datetime import date
 import xbmc
 import xbmcaddon
 import xbmcgui
-import xml.etree.ElementTree as ET
 import unidecode
 
+try:
+    from lxml import etree as ET
+except ImportError:
+    import xml.etree.ElementTree as ET
+
+# Prefer the faster orjson codec for the series database when installed
+try:
+    import orjson
+
+    def _json_dumps(data):
+        return orjson.dumps(data)
+    _json_loads = orjson.loads
+except ImportError:
+    def _json_dumps(data):
+        return json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    _json_loads = json.loads
+
 try:
     from urllib import urlencode
     from urlparse import parse_qsl
@@ -26,15 +48,114 @@ try:
 except ImportError:
     from xbmcvfs import translatePath
 
-# Regular expressions for detecting episode patterns
-EPISODE_PATTERNS = [
-    r'[Ss](\d+)[Ee](\d+)',  # S01E01 format
-    r'(\d+)x(\d+)',         # 1x01 format
-    r'[Ee]pisode\s*(\d+)',  # Episode 1 format
-    r'[Ee]p\s*(\d+)',       # Ep 1 format
-    r'[Ee](\d+)',           # E1 format
-    r'(\d+)\.\s*(\d+)'      # 1.01 format
+# Regular expressions for detecting episode patterns, strongest format first
+EPISODE_FORMATS = [
+    ('se', r'[Ss](?P<s1>\d+)[Ee](?P<e1>\d+)'),   # S01E01 format
+    ('x', r'(?P<s2>\d+)x(?P<e2>\d+)'),           # 1x01 format
+    ('ep', r'[Ee]pisode\s*(?P<e3>\d+)'),         # Episode 1 format
+    ('epx', r'[Ee]p\s*(?P<e4>\d+)'),             # Ep 1 format
+    ('ejust', r'[Ee](?P<e5>\d+)'),               # E1 format
+    ('dot', r'(?P<s3>\d+)\.\s*(?P<e6>\d+)')      # 1.01 format
 ]
+EPISODE_FORMAT_RES = [(name, re.compile(pattern, re.IGNORECASE)) for name, pattern in EPISODE_FORMATS]
+
+# All formats fused into one alternation so every name is scanned only once
+EPISODE_ALT = '|'.join(f'(?P<{name}>{pattern})' for name, pattern in EPISODE_FORMATS)
+EPISODE_RE = re.compile(EPISODE_ALT, re.IGNORECASE)
+
+# (season group, episode group) for each format, season defaults to 1
+EPISODE_GROUPS = {
+    'se': ('s1', 'e1'),
+    'x': ('s2', 'e2'),
+    'ep': (None, 'e3'),
+    'epx': (None, 'e4'),
+    'ejust': (None, 'e5'),
+    'dot': ('s3', 'e6')
+}
+
+def _episode_from_match(match):
+    """Return (season, episode) numbers from a match of EPISODE_ALT
+
+    The alternation returns the leftmost format, so a codec or audio tag
+    before the real marker would win. A stronger format found later in the
+    name takes priority, as when the formats were tried one by one.
+
+    >>> _episode_from_match(EPISODE_RE.search('show.x264.2x05'))
+    (2, 5)
+    >>> _episode_from_match(EPISODE_RE.search('show ac3 5.1 2x05 cz'))
+    (2, 5)
+    >>> _episode_from_match(EPISODE_RE.search('prison break 5.1 e09 complete'))
+    (1, 9)
+    >>> _episode_from_match(EPISODE_RE.search('the office dd5.1 episode 3'))
+    (1, 3)
+    """
+    kind = match.lastgroup
+    # A stronger format before this match would have been matched instead,
+    # so only the rest of the name needs to be searched
+    start = match.start(kind)
+    for name, pattern in EPISODE_FORMAT_RES:
+        if name == kind:
+            break
+        stronger = pattern.search(match.string, start)
+        if stronger:
+            match, kind = stronger, name
+            break
+    season_group, episode_group = EPISODE_GROUPS[kind]
+    season_num = int(match.group(season_group)) if season_group else 1
+    return season_num, int(match.group(episode_group))
+
+def _series_episode_re(norm_series):
+    """Compile the series name followed by any episode format
+
+    Matches go through _episode_from_match like EPISODE_RE ones, so the
+    format priority is the same, only markers after the name count.
+
+    >>> _episode_from_match(_series_episode_re('show').search('show.x264.2x05'))
+    (2, 5)
+    >>> _episode_from_match(_series_episode_re('show').search('show 7.1 ep12'))
+    (1, 12)
+    """
+    return re.compile(re.escape(norm_series) + r'.*?(?:' + EPISODE_ALT + r')', re.IGNORECASE)
+
+# Keywords hinting that a name belongs to a series, matched in one scan
+EPISODE_KEYWORDS = [
+    'episode', 'season', 'series', 'ep',
+    'complete', 'serie', 'disk'
+]
+EPISODE_KEYWORDS_RE = re.compile('|'.join(EPISODE_KEYWORDS))
+
+# Helper expressions used by normalization, fallback detection and filenames
+SEASON_RE = re.compile(r'season\s*(\d+)')
+NUMBER_RE = re.compile(r'(\d+)')
+WHITESPACE_RE = re.compile(r'\s+')
+UNSAFE_CHARS_RE = re.compile(r'[^\w\-_\. ]')
+
+# Lowercase ASCII and turn dashes, underscores and whitespace into spaces
+NORMALIZE_TABLE = {ord(c): ' ' for c in map(chr, range(128)) if c.isspace()}
+NORMALIZE_TABLE.update(str.maketrans(string.ascii_uppercase + '-_', string.ascii_lowercase + '  '))
+
+# Same mapping as _safe_filename for ASCII, unsafe characters and spaces become
+# underscores, uppercase letters are lowercased
+SAFE_FILENAME_TABLE = {c: '_' for c in range(128) if not chr(c).isalnum() and chr(c) not in '-_.'}
+SAFE_FILENAME_TABLE.update(str.maketrans(string.ascii_uppercase, string.ascii_lowercase))
+
+# Number of search queries sent to the API at the same time. The add-on's
+# api() posts through one shared requests.Session: its urllib3 connection pool
+# is thread-safe, the cookie jar locks internally, and search calls never
+# change the session headers, so concurrent posts do not interfere.
+MAX_SEARCH_WORKERS = 4
+
+# Transliterations of non-ASCII characters already seen, filled lazily
+_UNIDECODE_CACHE = {}
+
+def _unidecode_char(char):
+    """Transliterate a single character, caching the result"""
+    ascii_char = _UNIDECODE_CACHE.get(char)
+    if ascii_char is None:
+        ascii_char = unidecode.unidecode(char)
+        _UNIDECODE_CACHE[char] = ascii_char
+    return ascii_char
+
 
 class SeriesManager:
     def __init__(self, addon, profile):
@@ -53,23 +174,26 @@ class SeriesManager:
         except Exception as e:
             xbmc.log(f'YaWSP Series Manager: Error creating directories: {str(e)}', level=xbmc.LOGERROR)
     
-    def _normalize(self, text):
+    @staticmethod
+    @functools.lru_cache(maxsize=4096)
+    def _normalize(text):
         # Remove diacritics, replace spaces, dashes, underscores, lowercase
+        # Cached, the same series and file names are normalized repeatedly
         if not text:
             return ''
-        text = unidecode.unidecode(text)
-        text = text.lower()
-        text = text.replace('-', ' ')
-        text = text.replace('_', ' ')
-        text = re.sub(r'\s+', ' ', text)
-        text = text.strip()
-        return text
+        if not text.isascii():
+            text = ''.join(_unidecode_char(c) if ord(c) > 127 else c for c in text)
+        # Text is ASCII now, a single translate pass does the rest
+        text = text.translate(NORMALIZE_TABLE)
+        if '  ' in text:
+            text = WHITESPACE_RE.sub(' ', text)
+        return text.strip()
     
     def search_series(self, series_name, api_function, token):
         """Search for episodes of a series"""
         series_data = {
             'name': series_name,
-            'last_updated': xbmc.getInfoLabel('System.Date'),
+            'last_updated': date.today().isoformat(),
             'seasons': {}
         }
         
@@ -78,6 +202,8 @@ class SeriesManager:
         name_nospaces = norm_name.replace(' ', '')
         name_with_underscores = norm_name.replace(' ', '_')
         name_with_dashes = norm_name.replace(' ', '-')
+        # Series name followed by an episode marker, filters and extracts at once
+        series_re = _series_episode_re(norm_name)
         
         # Define search queries to try (more variants)
         search_queries = [
@@ -93,25 +219,36 @@ class SeriesManager:
             f"{norm_name} s01",
             f"{norm_name} episode"
         ]
+        # Drop duplicate variants (e.g. already normalized names), keep order
+        search_queries = list(dict.fromkeys(search_queries))
         
-        all_results = []
-        for query in search_queries:
-            results = self._perform_search(query, api_function, token)
-            for result in results:
-                if result not in all_results and self._is_likely_episode(result['name'], series_name):
-                    all_results.append(result)
+        # Collect unique results keyed by ident, with their episode numbers.
+        # Queries run in parallel batches but are processed in order, so the
+        # result does not depend on which response arrives first. A failing
+        # query stops the search before any further batch is sent.
+        all_results = {}
+        with ThreadPoolExecutor(max_workers=MAX_SEARCH_WORKERS) as executor:
+            for start in range(0, len(search_queries), MAX_SEARCH_WORKERS):
+                batch = search_queries[start:start + MAX_SEARCH_WORKERS]
+                for results in executor.map(self._perform_search, batch, repeat(api_function), repeat(token)):
+                    for result in results:
+                        ident = result.get('ident')
+                        if not ident or ident in all_results:
+                            continue
+                        norm_filename = self._normalize(result['name'])
+                        match = series_re.search(norm_filename)
+                        if match:
+                            # Same format priority as _detect_episode_info
+                            all_results[ident] = (result, _episode_from_match(match))
+                        elif self._is_likely_episode(norm_filename, norm_name):
+                            # Keyword-only names and unusual layouts take the slow path
+                            all_results[ident] = (result, self._detect_episode_info(norm_filename, norm_name))
         
-        episodes = {}
-        for item in all_results:
-            season_num, episode_num = self._detect_episode_info(item['name'], series_name)
+        # Files grouped by season and episode number, keys stay ints until saving
+        episodes = defaultdict(lambda: defaultdict(list))
+        for item, (season_num, episode_num) in all_results.values():
             if season_num is not None:
-                season_num_str = str(season_num)
-                episode_num_str = str(episode_num)
-                if season_num_str not in episodes:
-                    episodes[season_num_str] = {}
-                if episode_num_str not in episodes[season_num_str]:
-                    episodes[season_num_str][episode_num_str] = []
-                episodes[season_num_str][episode_num_str].append({
+                episodes[season_num][episode_num].append({
                     'name': item['name'],
                     'ident': item['ident'],
                     'size': item.get('size', '0')
@@ -119,31 +256,23 @@ class SeriesManager:
         # Prevedu do formatu pro ulozeni (prvni jako hlavni, ostatni jako streams)
         series_data['seasons'] = {}
         for season_num, season in episodes.items():
-            series_data['seasons'][season_num] = {}
+            season_data = series_data['seasons'][str(season_num)] = {}
             for episode_num, files in season.items():
-                main = files[0]
+                # Copy the main file, so that it is not part of its own streams
+                main = dict(files[0])
                 main['streams'] = files
-                series_data['seasons'][season_num][episode_num] = main
+                season_data[str(episode_num)] = main
         self._save_series_data(series_name, series_data)
         return series_data
     
-    def _is_likely_episode(self, filename, series_name):
-        # Use normalized comparison
-        norm_filename = self._normalize(filename)
-        norm_series = self._normalize(series_name)
+    def _is_likely_episode(self, norm_filename, norm_series):
+        # Use normalized comparison, both names are already normalized
         if norm_series not in norm_filename:
             return False
-        for pattern in EPISODE_PATTERNS:
-            if re.search(pattern, filename, re.IGNORECASE):
-                return True
-        episode_keywords = [
-            'episode', 'season', 'series', 'ep', 
-            'complete', 'serie', 'disk'
-        ]
-        for keyword in episode_keywords:
-            if keyword in norm_filename:
-                return True
-        return False
+        # Cheap keyword scan first, the episode regex only when it misses
+        if EPISODE_KEYWORDS_RE.search(norm_filename):
+            return True
+        return EPISODE_RE.search(norm_filename) is not None
     
     def _perform_search(self, search_query, api_function, token):
         """Perform the actual search using the provided API function"""
@@ -160,40 +289,42 @@ class SeriesManager:
             'maybe_removed': 'true'
         })
         
-        xml = ET.fromstring(response.content)
-        
-        # Check if the search was successful
-        status = xml.find('status')
-        if status is not None and status.text == 'OK':
-            # Convert XML to a list of dictionaries
-            for file in xml.iter('file'):
+        # Parse incrementally, converting each file to a dictionary and
+        # releasing its element as soon as it is complete
+        status = None
+        for event, elem in ET.iterparse(io.BytesIO(response.content), events=('end',)):
+            if elem.tag == 'status':
+                status = elem.text
+            elif elem.tag == 'file':
                 item = {}
-                for elem in file:
-                    item[elem.tag] = elem.text
+                for child in elem:
+                    item[child.tag] = child.text
                 results.append(item)
+                elem.clear()
+        
+        # Check if the search was successful
+        if status != 'OK':
+            return []
         
         return results
     
-    def _detect_episode_info(self, filename, series_name):
-        # Use normalized names for cleaning
-        norm_filename = self._normalize(filename)
-        norm_series = self._normalize(series_name)
+    def _detect_episode_info(self, norm_filename, norm_series):
+        # Use normalized names for cleaning, both are already normalized
         cleaned = norm_filename.replace(norm_series, '').strip()
-        for pattern in EPISODE_PATTERNS:
-            match = re.search(pattern, cleaned)
-            if match:
-                groups = match.groups()
-                if len(groups) == 2:
-                    return int(groups[0]), int(groups[1])
-                elif len(groups) == 1:
-                    return 1, int(groups[0])
-        if 'season' in cleaned or 'serie' in cleaned:
-            season_match = re.search(r'season\s*(\d+)', cleaned)
-            if season_match:
-                season_num = int(season_match.group(1))
-                ep_match = re.search(r'(\d+)', cleaned.replace(season_match.group(0), ''))
-                if ep_match:
-                    return season_num, int(ep_match.group(1))
+        # A recognized episode format is conclusive, return right away
+        match = EPISODE_RE.search(cleaned)
+        if match:
+            return _episode_from_match(match)
+        # Fallback, 'season N' with the episode as the first other number
+        if 'season' not in cleaned:
+            return None, None
+        season_match = SEASON_RE.search(cleaned)
+        if season_match:
+            season_num = int(season_match.group(1))
+            ep_match = (NUMBER_RE.search(cleaned, 0, season_match.start())
+                        or NUMBER_RE.search(cleaned, season_match.end()))
+            if ep_match:
+                return season_num, int(ep_match.group(1))
         return None, None
     
     def _save_series_data(self, series_name, series_data):
@@ -202,13 +333,9 @@ class SeriesManager:
         file_path = os.path.join(self.series_db_path, f"{safe_name}.json")
         
         try:
-            with io.open(file_path, 'w', encoding='utf8') as file:
-                try:
-                    data = json.dumps(series_data, indent=2).decode('utf8')
-                except AttributeError:
-                    data = json.dumps(series_data, indent=2)
+            data = _json_dumps(series_data)
+            with io.open(file_path, 'wb') as file:
                 file.write(data)
-                file.close()
         except Exception as e:
             xbmc.log(f'YaWSP Series Manager: Error saving series data: {str(e)}', level=xbmc.LOGERROR)
     
@@ -221,14 +348,8 @@ class SeriesManager:
             return None
         
         try:
-            with io.open(file_path, 'r', encoding='utf8') as file:
-                data = file.read()
-                file.close()
-                try:
-                    series_data = json.loads(data, "utf-8")
-                except TypeError:
-                    series_data = json.loads(data)
-                return series_data
+            with io.open(file_path, 'rb') as file:
+                return _json_loads(file.read())
         except Exception as e:
             xbmc.log(f'YaWSP Series Manager: Error loading series data: {str(e)}', level=xbmc.LOGERROR)
             return None
@@ -238,16 +359,18 @@ class SeriesManager:
         series_list = []
         
         try:
-            for filename in os.listdir(self.series_db_path):
-                if filename.endswith('.json'):
-                    series_name = os.path.splitext(filename)[0]
-                    # Convert safe filename back to proper name (rough conversion)
-                    proper_name = series_name.replace('_', ' ')
-                    series_list.append({
-                        'name': proper_name,
-                        'filename': filename,
-                        'safe_name': series_name
-                    })
+            with os.scandir(self.series_db_path) as entries:
+                for entry in entries:
+                    if entry.name.endswith('.json') and entry.is_file():
+                        filename = entry.name
+                        series_name = os.path.splitext(filename)[0]
+                        # Convert safe filename back to proper name (rough conversion)
+                        proper_name = series_name.replace('_', ' ')
+                        series_list.append({
+                            'name': proper_name,
+                            'filename': filename,
+                            'safe_name': series_name
+                        })
         except Exception as e:
             xbmc.log(f'YaWSP Series Manager: Error listing series: {str(e)}', level=xbmc.LOGERROR)
         
@@ -255,8 +378,10 @@ class SeriesManager:
     
     def _safe_filename(self, name):
         """Convert a series name to a safe filename"""
-        # Replace problematic characters
-        safe = re.sub(r'[^\w\-_\. ]', '_', name)
+        if name.isascii():
+            return name.translate(SAFE_FILENAME_TABLE)
+        # Replace problematic characters, non-ASCII letters are kept as they are
+        safe = UNSAFE_CHARS_RE.sub('_', name)
         return safe.lower().replace(' ', '_')
 
 # Utility functions for the UI layer